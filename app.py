@@ -2,17 +2,14 @@
 Procesador de Picking List - Banchero Sanitarios
 Versión mejorada: soporta PDFs con texto multilínea y códigos pegados
 """
+import os
 import streamlit as st
-import pdfplumber
 import pandas as pd
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm, cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from pypdf import PdfReader, PdfWriter
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from itertools import repeat
+from functools import lru_cache
 import re
 from datetime import datetime
 
@@ -22,10 +19,55 @@ st.set_page_config(
     layout="wide"
 )
 
+# Patrones compilados una sola vez a nivel módulo (evita re-lookup por línea)
+_FV_GLUE_RE = re.compile(r'([A-Z0-9]*[A-Z]{1,2})(\d{4}[/\.\-].*)$')
+# Solo la cabecera de la fila: cantidad y stock se sacan antes con un
+# rsplit (son siempre los dos últimos tokens), así el motor de regex no
+# tiene que backtrackear el lazy (.+?) contra el final del segmento
+_ROW_HEAD_RE = re.compile(
+    r'(\d{1,3})\s*([A-Z]{2}[A-Z0-9]+)\s+([A-Z0-9][A-Za-z0-9]*)\s*(.+)$'
+)
+_STOCK_RE = re.compile(r'-?[\d.,]+')
+# Palabras con las que suele empezar un nombre de artículo en MAYÚSCULAS
+# (para despegarlo del código). Compiladas como una sola alternación;
+# el sort de más larga a más corta evita que un prefijo tape a la palabra
+# completa (RECEPTACULO antes que RECEPT)
+_KEYWORDS = (
+    'CODO', 'TUBO', 'FLEX', 'CURVA', 'GRAMPA', 'GRASA', 'SELLADOR',
+    'DECAPANTE', 'TEFLON', 'CAÑAMO', 'RECEPTACULO', 'RECEPT', 'CABINA',
+    'PILETA', 'RAMAL', 'CUPLA', 'CANILLA', 'LLAVE',
+)
+_KEYWORD_RE = re.compile(
+    '|'.join(map(re.escape, sorted(_KEYWORDS, key=len, reverse=True)))
+)
+# Frontera mayúscula→minúscula (código pegado al nombre): para strings tan
+# cortos un barrido directo de caracteres le gana al setup del motor de regex
+_UPPER_SET = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_LOWER_SET = frozenset('abcdefghijklmnopqrstuvwxyzáéíóúñ')
+# Tabla para sacar los puntos de miles del stock en un solo paso C
+_DROP_DOTS = str.maketrans('', '', '.')
+# Líneas de header/footer a saltear: una sola alternación compilada,
+# un único barrido C por línea (sin .upper() ni loop de substrings)
+_SKIP_RE = re.compile(
+    r'PICKING LIST|N[°º]:|FECHA:|HORA:|ESTADO:|COD VIEJO|PÁGINA|PREPARO:'
+    r'|CONTROLO:|COD COD|COMIENZO|FINALIZADO|ARTICULO|ALMACEN',
+    re.IGNORECASE
+)
+# Campos del header fusionados en una sola alternación: un único barrido
+# del texto de la página 1 en vez de una pasada por campo
+_HEADER_RE = re.compile(
+    r'N[°º]:\s*(?P<numero>\d+)'
+    r'|FECHA:\s*(?P<fecha>\d{1,2}/\d{1,2}/\d{4})'
+    r'|HORA:\s*(?P<hora>\d{2}:\d{2}:\d{2})'
+    r'|Estado:\s*(?P<estado>\w+)'
+)
+
 
+@lru_cache(maxsize=4096)
 def split_cod_viejo_articulo(cod_viejo_raw, articulo_raw):
     """
     Separa código viejo del artículo cuando están pegados.
+    Memoizada: los picking lists repiten descripciones entre líneas duplicadas.
     Casos manejados:
     1. Mayúscula+minúscula: FVMB1CR181Grifería -> FVMB1CR181 + Grifería
     2. Códigos FV pegados: RPFV0521CB0416/15.6-D -> RPFV0521CB + 0416/15.6-D
@@ -36,136 +78,340 @@ def split_cod_viejo_articulo(cod_viejo_raw, articulo_raw):
     full_text = cod_viejo_raw + articulo_raw
     
     # Caso 1: Mayúscula+minúscula en cod_viejo (código pegado a nombre)
-    match = re.search(r'[A-Z][a-záéíóúñ]', cod_viejo_raw)
-    if match and match.start() > 0:
-        cod_viejo = cod_viejo_raw[:match.start()]
-        articulo = cod_viejo_raw[match.start():] + (" " + articulo_raw if articulo_raw else "")
-        return cod_viejo.strip(), articulo.strip()
+    for i in range(1, len(cod_viejo_raw)):
+        if cod_viejo_raw[i] in _LOWER_SET and cod_viejo_raw[i - 1] in _UPPER_SET:
+            if i > 1:
+                cod_viejo = cod_viejo_raw[:i - 1]
+                articulo = cod_viejo_raw[i - 1:] + (" " + articulo_raw if articulo_raw else "")
+                return cod_viejo.strip(), articulo.strip()
+            # La frontera está al inicio: no hay código para separar
+            break
     
     # Caso 2: Códigos FV pegados a número de artículo (ej: RPFV0521CB0416/15.6-D)
-    match = re.search(r'^([A-Z0-9]*[A-Z]{1,2})(\d{4}[/\.\-].*)$', full_text)
+    match = _FV_GLUE_RE.match(full_text)
     if match:
         return match.group(1), match.group(2)
     
     # Caso 3: ** al final del código
     if cod_viejo_raw.endswith('**'):
         return cod_viejo_raw[:-2].strip(), '** ' + articulo_raw
-    
+
+    # Caso 4: nombre de artículo en MAYÚSCULAS pegado al código
+    # (ej: FVMB1CRCODO -> FVMB1CR + CODO)
+    match = _KEYWORD_RE.search(cod_viejo_raw)
+    if match and match.start() > 0:
+        cod_viejo = cod_viejo_raw[:match.start()]
+        articulo = cod_viejo_raw[match.start():] + (" " + articulo_raw if articulo_raw else "")
+        return cod_viejo.strip(), articulo.strip()
+
     return cod_viejo_raw, articulo_raw
 
 
-def extract_picking_data(pdf_file):
+# A partir de cuántas páginas conviene pagar el costo de armar el pool
+_PARALLEL_MIN_PAGES = 8
+
+
+def _extract_page_text(pdf_bytes, page_num):
+    """Texto plano de una página. Abre su propio reader: corre en un worker."""
+    from pypdf import PdfReader
+
+    return PdfReader(BytesIO(pdf_bytes)).pages[page_num].extract_text() or ""
+
+
+def _extract_page_texts(pdf_bytes):
+    """
+    Extrae el texto de todas las páginas, en orden.
+    Si PyMuPDF está instalado usa su backend C (por lejos el extractor más
+    rápido). Si no, pypdf; para PDFs grandes reparte las páginas entre
+    procesos, porque la extracción en Python es CPU-bound y retiene el GIL.
+    """
+    try:
+        import pymupdf  # dependencia opcional
+    except ImportError:
+        try:
+            import fitz as pymupdf  # nombre viejo del paquete
+        except ImportError:
+            pymupdf = None
+
+    if pymupdf is not None:
+        texts = []
+        with pymupdf.open(stream=pdf_bytes, filetype='pdf') as doc:
+            for page in doc:
+                # Un solo textpage por página: lo comparten search_for y la
+                # extracción (construirlo es la parte cara de get_text)
+                tp = page.get_textpage()
+                # La primera página del packing se detecta con search_for,
+                # sin armar el string completo: su texto solo se usa para
+                # este chequeo, así que alcanza con un marcador
+                if (page.search_for("Codigo Cliente", textpage=tp)
+                        and page.search_for("LN", textpage=tp)):
+                    texts.append("Codigo Cliente LN")
+                    break
+                texts.append(page.get_text("text", textpage=tp))
+        return texts
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(BytesIO(pdf_bytes))
+    n_pages = len(reader.pages)
+
+    workers = min(os.cpu_count() or 1, 8)
+    if n_pages >= _PARALLEL_MIN_PAGES and workers > 1:
+        # Por tandas: cuando el packing list arranca dentro de una tanda,
+        # las páginas siguientes (la mayoría en PDFs típicos) ni se extraen
+        texts = []
+        batch_size = workers * 4
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, n_pages, batch_size):
+                batch = range(start, min(start + batch_size, n_pages))
+                batch_texts = list(pool.map(
+                    _extract_page_text, repeat(pdf_bytes), batch, chunksize=4
+                ))
+                texts.extend(batch_texts)
+                if any("Codigo Cliente" in t and "LN" in t for t in batch_texts):
+                    break
+        return texts
+
+    texts = []
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        texts.append(text)
+        # Encontrado el inicio del packing: el resto de las páginas se
+        # pasa tal cual al merge, extraerlas sería trabajo tirado
+        if "Codigo Cliente" in text and "LN" in text:
+            break
+    return texts
+
+
+def extract_picking_data(pdf_bytes):
     """
     Extrae datos del picking list usando método robusto:
     1. Acumula todo el texto de las páginas de picking
     2. Separa por 'RIESTRA' (fin de cada línea)
     3. Parsea cada segmento buscando el patrón de datos
+
+    Devuelve las filas como dict de listas paralelas (una por columna):
+    más liviano que una lista de dicts y pandas lo consume directo.
     """
-    all_rows = []
+    lineas = []
+    codigos = []
+    cod_viejos = []
+    articulos = []
+    cantidades = []
+    stocks = []
     header_info = {}
     packing_start_page = None
-    
-    with pdfplumber.open(pdf_file) as pdf:
-        accumulated_text = ""
-        
-        for page_num, page in enumerate(pdf.pages):
-            text = page.extract_text() or ""
-            
-            # Detectar inicio de packing list
-            if "Codigo Cliente" in text and "LN" in text:
-                packing_start_page = page_num
-                break
-            
-            # Extraer header de página 1
-            if page_num == 0:
-                n_match = re.search(r'N[°º]:\s*(\d+)', text)
-                if n_match:
-                    header_info['numero'] = n_match.group(1)
-                fecha_match = re.search(r'FECHA:\s*(\d{1,2}/\d{1,2}/\d{4})', text)
-                if fecha_match:
-                    header_info['fecha'] = fecha_match.group(1)
-                hora_match = re.search(r'HORA:\s*(\d{2}:\d{2}:\d{2})', text)
-                if hora_match:
-                    header_info['hora'] = hora_match.group(1)
-            
-            # Acumular texto limpio (sin headers)
-            for line in text.split('\n'):
-                line = line.strip()
-                if not line:
-                    continue
-                # Saltar líneas de header/footer
-                if any(x in line.upper() for x in [
-                    'PICKING LIST', 'N°:', 'FECHA:', 'HORA:', 'ESTADO:', 
-                    'COD VIEJO', 'PÁGINA', 'PREPARO:', 'CONTROLO:', 
-                    'COD COD', 'COMIENZO', 'FINALIZADO', 'ARTICULO', 'ALMACEN'
-                ]):
-                    continue
-                accumulated_text += " " + line
-        
-        # Separar por RIESTRA (final de cada línea de datos)
-        segments = accumulated_text.split('RIESTRA')
-        
-        for seg in segments:
-            seg = seg.strip()
-            if not seg:
+    # Acumular en una lista y unir al final: el += sobre un string que
+    # crece es O(n²) en el peor caso
+    text_parts = []
+
+    page_texts = _extract_page_texts(pdf_bytes)
+
+    # Extraer header de página 1 (una sola vez, fuera del loop de páginas)
+    if page_texts:
+        for h_match in _HEADER_RE.finditer(page_texts[0]):
+            header_info[h_match.lastgroup] = h_match.group(h_match.lastgroup)
+
+    for page_num, text in enumerate(page_texts):
+        # Detectar inicio de packing list
+        if "Codigo Cliente" in text and "LN" in text:
+            packing_start_page = page_num
+            break
+
+        # Acumular texto limpio (sin headers)
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line:
                 continue
-            
-            # Buscar patrón: (basura) + LINEA + CODIGO + COD_VIEJO + ARTICULO + CANT + STOCK
-            # El número de línea puede estar pegado al código (ej: 109IAREPU...)
-            match = re.search(
-                r'(\d{1,3})\s*([A-Z]{2}[A-Z0-9]+)\s+([A-Z0-9][A-Za-z0-9]*)\s*(.+?)\s+(\d+)\s+(-?[\d.,]+)\s*$',
-                seg
+            # Saltar líneas de header/footer
+            if _SKIP_RE.search(line):
+                continue
+            text_parts.append(line)
+
+    # Separar por RIESTRA (final de cada línea de datos)
+    segments = " ".join(text_parts).split('RIESTRA')
+
+    for seg in segments:
+        seg = seg.strip()
+        if not seg:
+            continue
+
+        # Cantidad y stock son siempre los dos últimos tokens del segmento:
+        # separarlos con rsplit evita correr el regex sobre todo el texto
+        parts = seg.rsplit(None, 2)
+        if len(parts) != 3:
+            continue
+        head, cant_str, stock_raw = parts
+        if not cant_str.isdigit() or not _STOCK_RE.fullmatch(stock_raw):
+            continue
+
+        # Buscar patrón en la cabecera: (basura) + LINEA + CODIGO + COD_VIEJO + ARTICULO
+        # El número de línea puede estar pegado al código (ej: 109IAREPU...)
+        # search, no match/fullmatch: el segmento puede arrancar con restos
+        # de texto de la línea anterior que hay que saltear
+        match = _ROW_HEAD_RE.search(head)
+
+        if match:
+            # Separar cod_viejo y artículo si están pegados
+            cod_viejo, articulo = split_cod_viejo_articulo(
+                match.group(3), match.group(4).strip()
             )
-            
-            if match:
-                linea = int(match.group(1))
-                codigo = match.group(2)
-                cod_viejo_raw = match.group(3)
-                articulo_raw = match.group(4).strip()
-                
-                # Separar cod_viejo y artículo si están pegados
-                cod_viejo, articulo = split_cod_viejo_articulo(cod_viejo_raw, articulo_raw)
-                
-                # Parsear cantidad
-                cantidad = float(match.group(5))
-                
-                # Parsear stock (puede tener punto de miles: 2.203)
-                stock_str = match.group(6).replace('.', '').replace(',', '.')
-                stock = float(stock_str)
-                
-                all_rows.append({
-                    'linea_original': linea,
-                    'codigo': codigo,
-                    'cod_viejo': cod_viejo,
-                    'articulo': articulo,
-                    'cantidad': cantidad,
-                    'stock': stock,
-                    'almacen': 'RIESTRA'
-                })
-    
-    return all_rows, header_info, packing_start_page
 
+            lineas.append(int(match.group(1)))
+            codigos.append(match.group(2))
+            cod_viejos.append(cod_viejo)
+            articulos.append(articulo)
+            cantidades.append(int(cant_str))
+            # Parsear stock (puede tener punto de miles: 2.203)
+            stock_str = stock_raw.translate(_DROP_DOTS)
+            if ',' in stock_str:
+                stock_str = stock_str.replace(',', '.')
+            stocks.append(float(stock_str))
+
+    columns = {
+        'linea_original': lineas,
+        'codigo': codigos,
+        'cod_viejo': cod_viejos,
+        'articulo': articulos,
+        'cantidad': cantidades,
+        'stock': stocks,
+        'almacen': ['RIESTRA'] * len(lineas),
+    }
+    return columns, header_info, packing_start_page
+
+
+def process_picking_data(columns):
+    """
+    Agrupa por cod_viejo, suma cantidades y ordena.
 
-def process_picking_data(rows):
-    """Agrupa por cod_viejo, suma cantidades y ordena."""
-    if not rows:
+    Una sola pasada con un dict: para el tamaño típico de un picking list
+    (decenas/cientos de filas) el overhead de pandas groupby domina.
+    """
+    if not columns or not columns['cod_viejo']:
         return []
-    
-    df = pd.DataFrame(rows)
-    grouped = df.groupby('cod_viejo', as_index=False).agg({
-        'codigo': 'first',
-        'articulo': 'first',
-        'cantidad': 'sum',
-        'stock': 'first',
-        'almacen': 'first'
-    }).sort_values('cod_viejo')
-    
-    grouped['linea'] = range(1, len(grouped) + 1)
-    return grouped[['linea', 'codigo', 'cod_viejo', 'articulo', 'cantidad', 'stock', 'almacen']].to_dict('records')
+
+    agg = {}
+    for codigo, cod_viejo, articulo, cantidad, stock, almacen in zip(
+        columns['codigo'], columns['cod_viejo'], columns['articulo'],
+        columns['cantidad'], columns['stock'], columns['almacen']
+    ):
+        rec = agg.get(cod_viejo)
+        if rec is None:
+            agg[cod_viejo] = {
+                'codigo': codigo,
+                'cod_viejo': cod_viejo,
+                'articulo': articulo,
+                'cantidad': cantidad,
+                'stock': stock,
+                'almacen': almacen,
+            }
+        else:
+            rec['cantidad'] += cantidad
+
+    result = sorted(agg.values(), key=lambda r: r['cod_viejo'])
+    for i, rec in enumerate(result, 1):
+        rec['linea'] = i
+    return result
+
+
+@lru_cache(maxsize=1)
+def _pdf_constants():
+    """
+    Estilos y anchos de columna del PDF: datos puros, construidos una sola
+    vez (lru_cache mantiene el import de reportlab diferido).
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Spacer
+
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle('Title', parent=styles['Heading1'],
+                                fontSize=12, alignment=TA_CENTER, spaceAfter=3),
+        'footer': ParagraphStyle('Footer', fontSize=10, alignment=TA_LEFT),
+        # Spacer no guarda estado entre builds: se puede compartir
+        'spacer_small': Spacer(1, 0.1*cm),
+        'spacer_large': Spacer(1, 0.3*cm),
+        # Anchos de columna para A4 vertical
+        'col_widths': (0.6*cm, 2.4*cm, 12.4*cm, 1.1*cm, 1*cm, 1.4*cm, 0.8*cm),
+        # Comandos de estilo que no dependen de los datos (los BACKGROUND
+        # por fila del zebra se generan en cada build)
+        'table_cmds': (
+            # Header
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1B5E20')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 4),
+            ('TOPPADDING', (0, 0), (-1, 0), 4),
+
+            # Body
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
+            ('TOPPADDING', (0, 1), (-1, -1), 2),
+
+            # Alineaciones
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+            ('ALIGN', (2, 1), (2, -1), 'LEFT'),
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
+            ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
+            ('ALIGN', (5, 1), (5, -1), 'CENTER'),
+            ('ALIGN', (6, 1), (6, -1), 'CENTER'),
+            ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
+
+            # Bordes
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+        ),
+    }
+
+
+def _wrap_plain(text, font_size, max_width):
+    """
+    Corta el texto en líneas que entren en max_width (greedy por palabras;
+    una palabra más ancha que la columna se corta por caracteres).
+    Devuelve un string con '\\n': Table lo dibuja directo con drawString,
+    sin pasar por el parser de markup de Paragraph.
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    if stringWidth(text, 'Helvetica', font_size) <= max_width:
+        return text
+
+    lines = []
+    cur = ''
+    for word in text.split(' '):
+        cand = cur + ' ' + word if cur else word
+        if stringWidth(cand, 'Helvetica', font_size) <= max_width:
+            cur = cand
+            continue
+        if cur:
+            lines.append(cur)
+        while stringWidth(word, 'Helvetica', font_size) > max_width:
+            k = len(word)
+            while k > 1 and stringWidth(word[:k], 'Helvetica', font_size) > max_width:
+                k -= 1
+            lines.append(word[:k])
+            word = word[k:]
+        cur = word
+    if cur:
+        lines.append(cur)
+    return '\n'.join(lines)
 
 
 def generate_pdf(data, header_info):
     """Genera PDF en formato A4 vertical con columnas para llenado manual."""
+    # Import diferido: reportlab inicializa fuentes/plataforma al importarse
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+
     buffer = BytesIO()
     
     doc = SimpleDocTemplate(
@@ -174,127 +420,129 @@ def generate_pdf(data, header_info):
         rightMargin=0.3*cm,
         leftMargin=0.3*cm,
         topMargin=0.6*cm,
-        bottomMargin=0.6*cm
+        bottomMargin=0.6*cm,
+        # Comprimir los content streams: achica varias veces el PDF de salida
+        pageCompression=1
     )
     
-    styles = getSampleStyleSheet()
+    consts = _pdf_constants()
+    col_widths = consts['col_widths']
     elements = []
-    
-    # Estilos para celdas - 10pt
-    cell_style = ParagraphStyle('CellStyle', parent=styles['Normal'], fontSize=10, leading=11, wordWrap='CJK')
-    cod_style = ParagraphStyle('CodStyle', parent=styles['Normal'], fontSize=10, leading=11)
-    
-    title_style = ParagraphStyle(
-        'Title', 
-        parent=styles['Heading1'], 
-        fontSize=12, 
-        alignment=TA_CENTER, 
-        spaceAfter=3
-    )
-    
+
     # Header
     header_text = f"""<b>PICKING LIST N° {header_info.get('numero', '-')}</b> | Fecha: {header_info.get('fecha', '-')} | <i>Ordenado por Cód. Viejo</i>"""
-    elements.append(Paragraph(header_text, title_style))
-    elements.append(Spacer(1, 0.1*cm))
-    
+    elements.append(Paragraph(header_text, consts['title']))
+    elements.append(consts['spacer_small'])
+
     # Header de tabla
     table_data = [['#', 'COD VIEJO', 'ARTÍCULO', 'STK', 'CANT', 'REAL', '✓']]
-    
-    for row in data:
-        cant = row['cantidad']
-        cant_str = str(int(cant)) if cant == int(cant) else f"{cant:.2f}"
-        
-        stock = row['stock']
-        stock_str = str(int(stock)) if stock == int(stock) else f"{stock:.0f}"
-        
-        # Paragraph para wrap automático
-        cod_p = Paragraph(str(row['cod_viejo']), cod_style)
-        articulo_p = Paragraph(str(row['articulo']), cell_style)
-        
-        table_data.append([
+
+    # Códigos y artículos van como strings planos pre-cortados con '\n':
+    # Table los dibuja línea por línea con drawString, sin pasar por el
+    # parser de markup ni el layout de Paragraph (el costo por fila más
+    # pesado de Platypus)
+    cod_cells = [_wrap_plain(str(r['cod_viejo']), 10, col_widths[1] - 12) for r in data]
+    art_cells = [_wrap_plain(str(r['articulo']), 10, col_widths[2] - 12) for r in data]
+
+    table_data.extend(
+        [
             str(row['linea']),
-            cod_p,
-            articulo_p,
-            stock_str,
-            cant_str,
+            cod_cells[i],
+            art_cells[i],
+            # 'g' omite el .0 de los enteros sin la doble conversión a int
+            format(row['stock'], 'g'),
+            # cantidad es int de punta a punta: str directo, sin formatter
+            str(row['cantidad']),
             '',  # REAL - para llenar a mano
             ''   # ✓ - check
-        ])
-    
-    # Anchos de columna para A4 vertical
-    col_widths = [0.6*cm, 2.4*cm, 12.4*cm, 1.1*cm, 1*cm, 1.4*cm, 0.8*cm]
-    
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+        ]
+        for i, row in enumerate(data)
+    )
+
+    # Alturas de fila exactas a partir de los textos ya cortados:
+    # evita la pasada de medición de Table.wrap, el costo dominante
+    # de doc.build en tablas largas
+    row_heights = [20] + [
+        11 * max(art_cells[i].count('\n'), cod_cells[i].count('\n')) + 17
+        for i in range(len(data))
+    ]
+
+    table = Table(table_data, colWidths=col_widths, rowHeights=row_heights, repeatRows=1)
     
-    table.setStyle(TableStyle([
-        # Header
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1B5E20')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 4),
-        ('TOPPADDING', (0, 0), (-1, 0), 4),
-        
-        # Body
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
-        ('TOPPADDING', (0, 1), (-1, -1), 2),
-        
-        # Alineaciones
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-        ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-        ('ALIGN', (2, 1), (2, -1), 'LEFT'),
-        ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
-        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
-        ('ALIGN', (5, 1), (5, -1), 'CENTER'),
-        ('ALIGN', (6, 1), (6, -1), 'CENTER'),
-        ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
-        
-        # Bordes
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('BOX', (0, 0), (-1, -1), 1, colors.black),
-        
-        # Colores alternados
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
-        
-        # Columna REAL amarilla para destacar
+    # Colores alternados como comandos BACKGROUND explícitos (ROWBACKGROUNDS
+    # se expande internamente a esto mismo en cada build); la fila 1 es blanca
+    zebra = (colors.white, colors.HexColor('#F5F5F5'))
+    bg_cmds = tuple(
+        ('BACKGROUND', (0, i), (-1, i), zebra[(i - 1) % 2])
+        for i in range(1, len(table_data))
+    )
+
+    table.setStyle(TableStyle(consts['table_cmds'] + bg_cmds + (
+        # Columna REAL amarilla para destacar (después del zebra para que
+        # pise los fondos alternados, igual que antes)
         ('BACKGROUND', (5, 1), (5, -1), colors.HexColor('#FFFDE7')),
-    ]))
+    )))
     
     elements.append(table)
     
     # Footer
-    elements.append(Spacer(1, 0.3*cm))
-    footer_style = ParagraphStyle('Footer', fontSize=10, alignment=TA_LEFT)
+    elements.append(consts['spacer_large'])
     footer_text = """<b>PREPARO:</b> __________ <b>COMIENZO:</b> ________ | <b>CONTROLÓ:</b> __________ <b>FINALIZADO:</b> ________"""
-    elements.append(Paragraph(footer_text, footer_style))
+    elements.append(Paragraph(footer_text, consts['footer']))
     
     doc.build(elements)
     buffer.seek(0)
     return buffer
 
 
-def merge_with_packing(picking_buffer, original_pdf, packing_start_page):
-    """Combina el picking procesado con las páginas de packing del original."""
+def merge_with_packing(picking_pdf, pdf_bytes, packing_start_page):
+    """
+    Combina el picking procesado con las páginas de packing del original.
+    Recibe ambos PDFs como bytes: el buffer del upload se comparte tal cual,
+    sin copias intermedias ni seeks.
+    """
+    from pypdf import PageRange, PdfWriter
+
     output_buffer = BytesIO()
     writer = PdfWriter()
-    
-    # Agregar páginas del picking procesado
-    picking_reader = PdfReader(picking_buffer)
-    for page in picking_reader.pages:
-        writer.add_page(page)
-    
+
+    # Agregar páginas del picking procesado (append copia el árbol de páginas
+    # en una sola operación, sin re-registrar objeto por objeto ni armar
+    # readers intermedios propios)
+    writer.append(fileobj=BytesIO(picking_pdf))
+    picking_pages = len(writer.pages)
+
     # Agregar páginas del packing list original
-    original_pdf.seek(0)
-    original_reader = PdfReader(original_pdf)
-    for i in range(packing_start_page, len(original_reader.pages)):
-        writer.add_page(original_reader.pages[i])
-    
+    writer.append(fileobj=BytesIO(pdf_bytes), pages=PageRange(f"{packing_start_page}:"))
+    packing_pages = len(writer.pages) - picking_pages
+
     writer.write(output_buffer)
     output_buffer.seek(0)
-    return output_buffer, len(picking_reader.pages), len(original_reader.pages) - packing_start_page
+    return output_buffer, picking_pages, packing_pages
+
+
+@st.cache_data(show_spinner=False)
+def _run_pipeline(pdf_bytes):
+    """
+    Corre extracción + consolidación + generación del PDF.
+    Cacheado por contenido del archivo: los reruns de Streamlit (toggles,
+    clicks de descarga) no vuelven a procesar el PDF.
+    """
+    columns, header_info, packing_start = extract_picking_data(pdf_bytes)
+    processed_data = process_picking_data(columns)
+    picking_pdf = b""
+    if processed_data:
+        picking_pdf = generate_pdf(processed_data, header_info).getvalue()
+    return columns, header_info, packing_start, processed_data, picking_pdf
+
+
+@st.cache_data(show_spinner=False)
+def _run_merge(picking_pdf, pdf_bytes, packing_start):
+    """Merge cacheado por contenido; devuelve bytes listos para descargar."""
+    merged_buffer, picking_pages, packing_pages = merge_with_packing(
+        picking_pdf, pdf_bytes, packing_start
+    )
+    return merged_buffer.getvalue(), picking_pages, packing_pages
 
 
 def main():
@@ -308,28 +556,24 @@ def main():
     
     if uploaded_file:
         with st.spinner("Procesando..."):
-            # Hacer copia para merge posterior
-            uploaded_file.seek(0)
-            original_copy = BytesIO(uploaded_file.read())
-            uploaded_file.seek(0)
-            
-            # Extraer datos
-            rows, header_info, packing_start = extract_picking_data(uploaded_file)
-            
-            if not rows:
+            pdf_bytes = uploaded_file.getvalue()
+
+            # Extraer + procesar + generar PDF (cacheado por contenido)
+            columns, header_info, packing_start, processed_data, picking_pdf = \
+                _run_pipeline(pdf_bytes)
+            n_rows = len(columns['cod_viejo'])
+
+            if not n_rows:
                 st.error("No se pudieron extraer datos. Verificá que sea un picking list válido.")
                 return
-            
-            st.success(f"✅ {len(rows)} líneas extraídas del picking list")
-            
-            # Procesar
-            processed_data = process_picking_data(rows)
-            df_original = pd.DataFrame(rows)
-            duplicados = len(rows) - len(processed_data)
-            
+
+            st.success(f"✅ {n_rows} líneas extraídas del picking list")
+
+            duplicados = n_rows - len(processed_data)
+
             # Métricas
             col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Originales", len(rows))
+            col1.metric("Originales", n_rows)
             col2.metric("Consolidadas", len(processed_data))
             col3.metric("Duplicados", duplicados)
             if packing_start:
@@ -337,13 +581,15 @@ def main():
             else:
                 col4.metric("Packing list", "No encontrado")
             
-            # Mostrar duplicados si los hay
+            # Mostrar duplicados si los hay (agrupados en una sola pasada)
             if duplicados > 0:
-                dupes = df_original[df_original.duplicated('cod_viejo', keep=False)]
                 with st.expander("Ver duplicados consolidados"):
-                    for cod in dupes['cod_viejo'].unique():
-                        subset = df_original[df_original['cod_viejo'] == cod]
-                        st.write(f"**{cod}**: {list(subset['cantidad'])} → **{sum(subset['cantidad'])}**")
+                    grupos = defaultdict(list)
+                    for k, c in zip(columns['cod_viejo'], columns['cantidad']):
+                        grupos[k].append(c)
+                    for cod, cants in grupos.items():
+                        if len(cants) > 1:
+                            st.write(f"**{cod}**: {cants} → **{sum(cants)}**")
             
             st.divider()
             
@@ -352,7 +598,10 @@ def main():
             with col1:
                 st.markdown("#### Original")
                 st.dataframe(
-                    df_original[['linea_original', 'cod_viejo', 'articulo', 'cantidad']].head(15), 
+                    pd.DataFrame({
+                    k: columns[k][:15]
+                    for k in ('linea_original', 'cod_viejo', 'articulo', 'cantidad')
+                }), 
                     height=300, use_container_width=True
                 )
             with col2:
@@ -364,23 +613,19 @@ def main():
                 )
             
             st.divider()
-            
-            # Generar PDF
-            picking_buffer = generate_pdf(processed_data, header_info)
-            
+
             st.markdown("### 📄 Descargar PDF")
-            
+
             if packing_start:
-                picking_buffer.seek(0)
-                merged_buffer, picking_pages, packing_pages = merge_with_packing(
-                    picking_buffer, original_copy, packing_start
+                merged_pdf, picking_pages, packing_pages = _run_merge(
+                    picking_pdf, pdf_bytes, packing_start
                 )
                 
                 st.info(f"📋 PDF completo: {picking_pages} pág. picking + {packing_pages} pág. packing = **{picking_pages + packing_pages} páginas**")
                 
                 st.download_button(
                     "⬇️ Descargar PDF Completo (Picking + Packing)",
-                    merged_buffer,
+                    merged_pdf,
                     f"picking_{header_info.get('numero', 'procesado')}_completo.pdf",
                     "application/pdf",
                     type="primary",
@@ -388,18 +633,17 @@ def main():
                 )
                 
                 # Opción de solo picking
-                picking_buffer.seek(0)
                 with st.expander("Descargar solo el Picking List"):
                     st.download_button(
                         "⬇️ Solo Picking List",
-                        picking_buffer,
+                        picking_pdf,
                         f"picking_{header_info.get('numero', 'procesado')}_ordenado.pdf",
                         "application/pdf"
                     )
             else:
                 st.download_button(
                     "⬇️ Descargar PDF",
-                    picking_buffer,
+                    picking_pdf,
                     f"picking_{header_info.get('numero', 'procesado')}_ordenado.pdf",
                     "application/pdf",
                     type="primary",